@@ -10,19 +10,328 @@ A library for building command line applications
 '''
 
 from __future__ import print_function
+import csv
+import hashlib
+import json
+import os
+import shlex
 import sys
+import threading
+import traceback
+from array import array
+from collections import OrderedDict, namedtuple
+from itertools import chain, islice
+from multiprocessing.pool import Pool, ThreadPool
 from os import path
 
 __version__ = '0.4.6'
 __build__ = '1'
 __author__ = 'Kevin K. <kbknapp@gmail.com>'
 
+try:
+    _intern = sys.intern
+except AttributeError:
+    # Python 2.x, where only byte strings can be interned
+    def _intern(value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        return intern(value)
+
 
 def _null_func(context):
     """Represents a None for a function"""
     pass
 
 
+# Marks a value which was not set (None and False are valid values)
+_MISSING = object()
+
+# Undoes appending to a list by cutting it back to its former length
+_Truncate = namedtuple('_Truncate', ['length'])
+
+# The outcome of validating one command line; 'context' is never handed out
+# directly (see _copy_context) so a result may be cached and reused
+_ParseResult = namedtuple('_ParseResult',
+                          ['context', 'actions', 'subcmd', 'sub_result',
+                           'warnings'])
+
+
+def _copy_context(context):
+    """Returns a copy of a (possibly cached) context dict which the caller may
+    freely modify. Lists shared between the name, short and long keys of an
+    argument remain shared in the copy.
+    """
+    copied = dict()
+    lists = dict()
+    for key, value in context.items():
+        if isinstance(value, list):
+            if id(value) not in lists:
+                lists[id(value)] = list(value)
+            value = lists[id(value)]
+        elif isinstance(value, _RestArgs):
+            # Each run gets its own iterator over the remaining arguments
+            if id(value) not in lists:
+                lists[id(value)] = iter(value)
+            value = lists[id(value)]
+        copied[key] = value
+    return copied
+
+
+class _RestArgs(object):
+    """The remaining arguments of a command line for a rest=True positional
+    argument. Iterating yields them one at a time without copying them, and
+    a '-' yields the lines of stdin instead.
+    """
+    def __init__(self, head, args, start):
+        """PARAMS:
+            head: A list of arguments yielded first
+            args: The list of command line arguments
+            start: The index of the first argument in args after head
+        """
+        self._head = head
+        self._args = args
+        self._start = start
+
+    def __iter__(self):
+        for arg in chain(self._head, islice(self._args, self._start, None)):
+            if arg == '-':
+                for line in sys.stdin:
+                    yield line.rstrip('\n')
+            else:
+                yield arg
+
+
+def _exit_status(value):
+    """Converts what a main(context) returned into a process exit status"""
+    if value is None or value is True or value is False:
+        return int(bool(value))
+    if isinstance(value, int):
+        return value
+    return 0
+
+
+class _ArgumentError(SystemExit):
+    """Raised (in place of sys.exit(0)) after an invalid command line has been
+    reported, so a batch can tell it apart from --help or --version"""
+    pass
+
+
+class _BatchOutput(object):
+    """Stands in for sys.stdout or sys.stderr while a batch is dispatched.
+    Whatever a thread writes between capture() and release() is held back,
+    so each command line's output can be written out in command line order.
+    """
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.parts = []
+
+    def release(self):
+        """Stops capturing and returns what was written"""
+        parts = self._local.parts
+        self._local.parts = None
+        return ''.join(parts)
+
+    def write(self, text):
+        parts = getattr(self._local, 'parts', None)
+        if parts is None:
+            self._stream.write(text)
+        else:
+            parts.append(text)
+
+    def flush(self):
+        if getattr(self._local, 'parts', None) is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _run_parsed(app, result):
+    """Dispatches one parsed command line of a batch. An exception raised
+    by an action or main(context) gives the status 1 and its traceback is
+    written to stderr, so the rest of the batch carries on.
+    RETURN: A tuple of the exit status, whatever the main(context) of the
+            selected (sub-)command returned (or the exception raised), and
+            what was written to stdout and stderr if they are _BatchOutput()s
+            (otherwise '')
+    """
+    capturing = (isinstance(sys.stdout, _BatchOutput) and
+                 isinstance(sys.stderr, _BatchOutput))
+    if capturing:
+        sys.stdout.capture()
+        sys.stderr.capture()
+    try:
+        try:
+            value = app._dispatch_all(result)[1]
+        except SystemExit as e:
+            value = None
+            status = _exit_status(e.code)
+        except Exception as e:
+            traceback.print_exc()
+            value = e
+            status = 1
+        else:
+            if value is _MISSING:
+                value = None
+            status = _exit_status(value)
+    finally:
+        out = err = ''
+        if capturing:
+            out = sys.stdout.release()
+            err = sys.stderr.release()
+    return status, value, out, err
+
+
+# The App and parsed command lines a batch worker process dispatches from
+_batch_app = None
+_batch_parsed = None
+
+
+def _batch_init(app, parsed):
+    global _batch_app, _batch_parsed
+    _batch_app = app
+    _batch_parsed = parsed
+    # A forked worker inherits the parent's _BatchOutput()s
+    if not isinstance(sys.stdout, _BatchOutput):
+        sys.stdout = _BatchOutput(sys.stdout)
+    if not isinstance(sys.stderr, _BatchOutput):
+        sys.stderr = _BatchOutput(sys.stderr)
+
+
+def _batch_run(index):
+    return _run_parsed(_batch_app, _batch_parsed[index])
+
+
+def _edit_pattern(word):
+    """Precomputes what _edit_distance() needs to know about word: a bit mask
+    of the positions of each character, and its length"""
+    masks = dict()
+    for i, char in enumerate(word):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks, len(word)
+
+
+def _edit_distance(pattern, word):
+    """Returns the Levenshtein distance between the word a pattern was made
+    from and word, using Myers' bit-parallel algorithm (one pass over word
+    updating a column of the distance matrix at once)
+    PARAMS:
+        pattern: The result of _edit_pattern()
+        word: The other word as a string
+    """
+    masks, length = pattern
+    if not length:
+        return len(word)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    pos_v = full
+    neg_v = 0
+    distance = length
+    for char in word:
+        eq = masks.get(char, 0)
+        x_v = eq | neg_v
+        x_h = (((eq & pos_v) + pos_v) ^ pos_v) | eq
+        pos_h = neg_v | (~(x_h | pos_v) & full)
+        neg_h = pos_v & x_h
+        if pos_h & last:
+            distance += 1
+        elif neg_h & last:
+            distance -= 1
+        pos_h = ((pos_h << 1) | 1) & full
+        neg_h = (neg_h << 1) & full
+        pos_v = neg_h | (~(x_v | pos_h) & full)
+        neg_v = pos_h & x_v
+    return distance
+
+
+class _BKTree(object):
+    """A Burkhard-Keller tree of words. Each child is keyed by its edit
+    distance from its parent, so by the triangle inequality a search only
+    descends into the children which could be close enough, rather than
+    measuring the distance to every word.
+    """
+    def __init__(self, words=()):
+        # A node is a tuple of the word and a dict() of distance: node
+        self._root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self._root is None:
+            self._root = (word, dict())
+            return
+        pattern = _edit_pattern(word)
+        node = self._root
+        while True:
+            distance = _edit_distance(pattern, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (word, dict())
+                return
+            node = node[1][distance]
+
+    def search(self, word, max_distance):
+        """Returns a sorted list of (distance, word) tuples for the words no
+        more than max_distance edits away from word"""
+        found = []
+        if self._root is None:
+            return found
+        pattern = _edit_pattern(word)
+        nodes = [self._root]
+        while nodes:
+            node_word, children = nodes.pop()
+            distance = _edit_distance(pattern, node_word)
+            if distance <= max_distance:
+                found.append((distance, node_word))
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= max_distance:
+                    nodes.append(child)
+        found.sort()
+        return found
+
+
+class _LRUCache(object):
+    """A bounded mapping which evicts the least recently used entry"""
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._data = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """Returns the value stored for key (or None) and marks it as the most
+        recently used entry"""
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self._misses += 1
+            return None
+        self._data[key] = value
+        self._hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        if len(self._data) > self._max_size:
+            self._data.popitem(last=False)
+            self._evictions += 1
+
+    def clear(self):
+        self._data.clear()
+
+    def info(self):
+        return {'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'size': len(self._data),
+                'max_size': self._max_size}
+
+
 class App(object):
     """The starting point for a command line application"""
     def __init__(self,
@@ -31,7 +340,8 @@ class App(object):
                  usage='',
                  about='',
                  author='',
-                 main=_null_func):
+                 main=_null_func,
+                 cache_size=0):
         """Initializes a new version of the App class
         PARAMS:
             name: A string representing the name of the application
@@ -40,6 +350,8 @@ class App(object):
             main: A function which accepts a dict() and the starting point of
                   the app will be called after all command line argumetns have
                   been processed
+            cache_size: How many parsed command lines to remember (least
+                        recently used are dropped first). 0 disables caching
         """
         self._name = name
         self._author = author
@@ -62,89 +374,304 @@ class App(object):
         self._req_pos_args = []
         self._pos_args = []
         self._opts = []
-
-    def start(self):
+        self._cache = None
+        if cache_size > 0:
+            self._cache = _LRUCache(cache_size)
+        self._batch_results = []
+        # Built on the first call to suggest()
+        self._suggestions = None
+        self._prepared = False
+        # The apps this has been added to as a sub-command
+        self._parents = []
+
+    def start(self, args=None):
         """Called when the user wants to start processing command line arguments
         and start his main(context) function
+        PARAMS:
+            args: (optional) A list of command line arguments, including the
+                  script name, to use instead of sys.argv
         RETURN: Returns whatever your main(context) returns in order to allow
                 sys.exit(app.start())
         """
+        self._prepare()
+        if args is None:
+            args = sys.argv
+        return self._dispatch(self._parse(args))
+
+    def start_many(self,
+                   args=None,
+                   delimiter='---',
+                   from_file='',
+                   jobs=1,
+                   processes=False):
+        """Runs several command lines in one invocation. All command lines are
+        parsed up front, then dispatched to their main(context) functions by a
+        pool of at most jobs threads (or processes).
+        PARAMS:
+            args: (optional) A list of command line arguments, including the
+                  script name, to use instead of sys.argv. The command lines
+                  are separated by delimiter i.e.
+                  myapp.py sync a --- sync b
+            delimiter: The argument separating command lines
+            from_file: (optional) A file with one command line per line to
+                       use instead of args (blank lines and lines starting
+                       with # are ignored)
+            jobs: The maximum number of command lines dispatched at once.
+                  Anything printed while parsing or dispatching is collected
+                  and written out in command line order
+            processes: Use a process pool instead of a thread pool (actions,
+                       mains and their return values must be picklable)
+        RETURN: The first non-zero exit status in command line order (or 0),
+                where a command line which isn't valid has the status 2 and
+                one whose main(context) raised an exception has the status 1
+                in order to allow sys.exit(app.start_many()). The status and
+                return value of the main(context) selected by each command
+                line (a sub-command's main if it has one) are kept in
+                App.batch_results
+        """
+        self._prepare()
+        if args is None:
+            args = sys.argv
+
+        cmd_lines = []
+        if from_file:
+            with open(from_file) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        cmd_lines.append([args[0]] + shlex.split(line))
+        else:
+            cmd_line = [args[0]]
+            for arg in args[1:]:
+                if arg == delimiter:
+                    if len(cmd_line) > 1:
+                        cmd_lines.append(cmd_line)
+                    cmd_line = [args[0]]
+                else:
+                    cmd_line.append(arg)
+            if len(cmd_line) > 1:
+                cmd_lines.append(cmd_line)
+
+        # Everything printed, whether while parsing (i.e. argument errors or
+        # --help) or by a main(context), is held back per command line and
+        # written out in command line order
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout = _BatchOutput(stdout)
+        sys.stderr = _BatchOutput(stderr)
+        pool = None
+        try:
+            # A command line which fails to parse is never dispatched, it
+            # only contributes the status it exited with (2 for an invalid
+            # command line, or that of --help or --version)
+            parsed = []
+            parse_outcomes = []
+            for cmd_line in cmd_lines:
+                sys.stdout.capture()
+                sys.stderr.capture()
+                status = None
+                try:
+                    parsed.append(self._parse(cmd_line))
+                except _ArgumentError:
+                    status = 2
+                except SystemExit as e:
+                    status = _exit_status(e.code)
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+                finally:
+                    out = sys.stdout.release()
+                    err = sys.stderr.release()
+                parse_outcomes.append((status, out, err))
+
+            if jobs > 1 and len(parsed) > 1:
+                if processes:
+                    pool = Pool(jobs, _batch_init, (self, parsed))
+                    results = pool.imap(_batch_run, range(len(parsed)))
+                else:
+                    pool = ThreadPool(jobs)
+                    results = pool.imap(
+                        lambda result: _run_parsed(self, result), parsed)
+            else:
+                results = (_run_parsed(self, result) for result in parsed)
+
+            self._batch_results = []
+            for status, out, err in parse_outcomes:
+                stdout.write(out)
+                stderr.write(err)
+                value = None
+                if status is None:
+                    status, value, out, err = next(results)
+                    stdout.write(out)
+                    stderr.write(err)
+                self._batch_results.append((status, value))
+            if pool is not None:
+                pool.close()
+        except BaseException:
+            if pool is not None:
+                pool.terminate()
+            raise
+        finally:
+            if pool is not None:
+                pool.join()
+            sys.stdout, sys.stderr = stdout, stderr
+
+        for status, value in self._batch_results:
+            if status:
+                return status
+        return 0
+
+    def _prepare(self):
+        """Adds the arguments clapp provides for free before parsing"""
+        if self._prepared:
+            return
         # Add a help command line argument if needed (i.e. -h and --help)
         self._add_help()
         # Add a version command line argument if needed (i.e. -v and --version)
         self._add_version()
+        self._prepared = True
+
+    def _parse(self, raw_args):
+        """Validates raw_args, re-using a cached result for an identical
+        command line if the parse cache is enabled
+        PARAMS:
+            raw_args: A list of command line arguments including the script
+                      name
+        RETURN: A _ParseResult
+        """
+        self._raw_args = raw_args
+        if self._cache is None:
+            return self._do_args(list(raw_args[1:]))
+        key = tuple(raw_args)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._do_args(list(raw_args[1:]))
+            self._cache.put(key, result)
+        return result
+
+    def _dispatch(self, result):
+        """Performs the actions, sub-command and main(context) of a parsed
+        command line. This is done on every run, even when the parse itself
+        came from the cache.
+        PARAMS:
+            result: The _ParseResult returned by _parse()
+        RETURN: Returns whatever main(context) returns, or the context
+        """
+        return self._dispatch_all(result)[0]
+
+    def _dispatch_all(self, result):
+        """Same as _dispatch() but also reports on the selected sub-command
+        RETURN: A tuple of what _dispatch() returns and what the innermost
+                main(context) which was called returned (_MISSING if none)
+        """
+        # Warnings are shown on every run, not only when the parse was done
+        for warning in result.warnings:
+            print(warning)
 
-        self._context['raw_args'] = sys.argv
-        self._do_args(sys.argv[1:])
+        context = _copy_context(result.context)
+        self._context = context
+        for act in result.actions:
+            act(context)
 
+        selected = _MISSING
+        if result.subcmd:
+            selected = result.subcmd._dispatch_all(result.sub_result)[1]
+
+        value = context
         if self._has_main:
-            return self._main(self._context)
-        return self._context
+            value = self._main(context)
+            if selected is _MISSING:
+                selected = value
+        return value, selected
 
     def _do_args(self, args):
-        """Validates the command line arguments passed to the script and performs
-        any actions they call for.
+        """Validates the command line arguments passed to the script and
+        collects any actions they call for.
         PARAMS:
             args: A list of command line arguments (pulled from sys.argv[1:])
+        RETURN: A _ParseResult holding the context, the actions to perform,
+                the selected sub-command (if any) with its own result and the
+                warnings to display when it is dispatched
         """
 
+        context = {'raw_args': self._raw_args}
         actions_todo = []
+        warnings = []
         pos_args = 0
-        skip_next = False
-        num_to_skip = 0
         possible_pos_args = len(self._pos_args) + len(self._req_pos_args)
         subcmd = None
+        # Pieces split off of an argument (i.e. --out=file or -abc) which are
+        # processed before args[i], kept in reverse order so that splitting
+        # never has to insert into args
+        split = []
+        i = 0
+
+        while split or i < len(args):
+            if split:
+                arg = split.pop()
+            else:
+                arg = args[i]
+                i += 1
+
+            # Everything from the first argument for a rest=True positional
+            # onward belongs to it, unparsed
+            rest = self._args_map.get('index{}'.format(pos_args + 1))
+            if (rest and rest.rest and arg not in self._args_map and
+                    arg not in self._subcmds_map and
+                    (arg == '-' or not arg.startswith('-'))):
+                pos_args += 1
+                rest_args = _RestArgs([arg] + split[::-1], args, i)
+                context[rest.name] = rest_args
+                context['index{}'.format(rest.index)] = rest_args
+                if rest.has_action:
+                    actions_todo.append(rest.action)
+                break
 
-        for i, arg in enumerate(args):
-            if skip_next and num_to_skip > 0:
-                num_to_skip -= 1
-                continue
-            skip_next = False
-            num_to_skip = 0
             if arg.find('=') != -1:
-                arg, next_arg = arg.split('=')
-                args.insert(i+1, next_arg)
+                arg, next_arg = arg.split('=', 1)
+                split.append(next_arg)
 
             if not arg.startswith('--') and arg[0] == '-' and len(arg) > 2:
-                for j, char in enumerate(arg):
-                    if char == '-':
-                        continue
-                    args.insert(i + 1 + j, '-{}'.format(char))
+                split.extend(reversed(['-{}'.format(char)
+                                       for char in arg if char != '-']))
                 continue
 
             if arg not in self._args_map:
                 if arg in self._subcmds_map:
-                    subcmd = self._subcmds_map[arg]
-                    args = args[i:]
-                    args[0] = '{} {}'.format(self._raw_args[0], args[0])
+                    subcmd = self._get_subcmd(arg)
+                    args = ['{} {}'.format(self._raw_args[0], arg)] + \
+                        split[::-1] + args[i:]
                     break
                 if possible_pos_args and arg[0] != '-':
                     pos_args += 1
                     index = 'index{}'.format(pos_args)
-                    self._context[self._args_map[index].name] = arg
-                    self._context[index] = arg
+                    context[self._args_map[index].name] = arg
+                    context[index] = arg
                     arg = self._args_map[index].name
                 elif not possible_pos_args:
                     print('Argument error from {}\n{} doesn\'t accept '
-                          'positional arguments.'.format(arg,
-                                                         self._raw_args[0]))
+                          'positional arguments.{}'.format(
+                              arg, self._raw_args[0], self._did_you_mean(arg)))
                     self._display_usage(exit=True)
                 else:
                     print('Argument error from {}\n{} doesn\'t accept any '
-                          'arguments like {}.'.format(arg,
-                                                      self._raw_args[0],
-                                                      arg))
+                          'arguments like {}.{}'.format(
+                              arg, self._raw_args[0], arg,
+                              self._did_you_mean(arg)))
                     self._display_usage(exit=True)
 
             argo = self._args_map[arg]
             if argo.args_taken:
-                if i+argo.args_taken == len(args):
+                if len(split) + len(args) - i < argo.args_taken:
                     print('Argument error from {}\n{} expected {} arguments '
                           'but received 0.'.format(arg, arg, argo.args_taken))
                     self._display_usage(exit=True)
                 taken_args = []
                 for j in range(argo.args_taken):
-                    possible_arg = args[i + 1 + j]
+                    if split:
+                        possible_arg = split.pop()
+                    else:
+                        possible_arg = args[i]
+                        i += 1
                     if possible_arg.startswith('-'):
                         print('Argument error from {}\n{} expected {} '
                               'arguments but '
@@ -154,19 +681,28 @@ class App(object):
                                                     len(taken_args)))
                         self._display_usage(exit=True)
                     taken_args.append(possible_arg)
-                self._context[argo.name] = taken_args
+                if argo.multiple and argo.name in context:
+                    # The name, short and long keys share this one list
+                    context[argo.name].extend(taken_args)
+                else:
+                    context[argo.name] = taken_args
+                    if argo.short:
+                        context[argo.short] = taken_args
+                    if argo.long:
+                        context[argo.long] = taken_args
+            elif argo.count:
+                count = context.get(argo.name, 0) + 1
+                context[argo.name] = count
                 if argo.short:
-                    self._context[argo.short] = taken_args
+                    context[argo.short] = count
                 if argo.long:
-                    self._context[argo.long] = taken_args
-                skip_next = True
-                num_to_skip = argo.args_taken
+                    context[argo.long] = count
             elif argo in self._flags:
-                self._context[argo.name] = True
+                context[argo.name] = True
                 if argo.short:
-                    self._context[argo.short] = True
+                    context[argo.short] = True
                 if argo.long:
-                    self._context[argo.long] = True
+                    context[argo.long] = True
             if argo.has_action:
                 actions_todo.append(argo.action)
 
@@ -180,47 +716,68 @@ class App(object):
             self._display_usage(exit=True)
 
         for arg in self._req_opts:
-            if arg.name not in self._context:
+            if arg.name not in context:
                 display_name = ''
                 if arg.long:
                     display_name = arg.long
                 else:
                     display_name = arg.short
-                print('Argument error.\nRequired option {} not found.'
-                      .format(display_name))
+                warnings.append('Argument error.\nRequired option {} not '
+                                'found.'.format(display_name))
 
         for flag in self._flags:
-            if flag.name not in self._context:
-                self._context[flag.name] = False
+            # Unused count=True args default to 0 below
+            if flag.name not in context and not flag.count:
+                context[flag.name] = False
                 if flag.short:
-                    self._context[flag.short] = False
+                    context[flag.short] = False
                 if flag.long:
-                    self._context[flag.long] = False
+                    context[flag.long] = False
 
         for arg in set(self._args_map.values()):
-            if arg.name not in self._context:
-                if arg.default:
-                    self._context[arg.name] = arg.default
+            if arg.name not in context:
+                if arg.rest:
+                    rest_args = _RestArgs([], [], 0)
+                    context[arg.name] = rest_args
+                    context['index{}'.format(arg.index)] = rest_args
+                elif arg.count:
+                    context[arg.name] = 0
                     if arg.short:
-                        self._context[arg.short] = arg.default
+                        context[arg.short] = 0
                     if arg.long:
-                        self._context[arg.long] = arg.default
+                        context[arg.long] = 0
+                elif arg.default:
+                    context[arg.name] = arg.default
+                    if arg.short:
+                        context[arg.short] = arg.default
+                    if arg.long:
+                        context[arg.long] = arg.default
                     if arg.index:
-                        self._context['index{}'.format(arg.index)] = arg.default
+                        context['index{}'.format(arg.index)] = arg.default
+                elif arg.multiple and arg.args_taken:
+                    # Shared like a used one; each run gets its own copy
+                    values = []
+                    context[arg.name] = values
+                    if arg.short:
+                        context[arg.short] = values
+                    if arg.long:
+                        context[arg.long] = values
                 else:
-                    self._context[arg.name] = False
+                    context[arg.name] = False
                     if arg.short:
-                        self._context[arg.short] = False
+                        context[arg.short] = False
                     if arg.long:
-                        self._context[arg.long] = False
+                        context[arg.long] = False
                     if arg.index:
-                        self._context['index{}'.format(arg.index)] = False
-
-        for act in actions_todo:
-            act(self._context)
+                        context['index{}'.format(arg.index)] = False
 
+        sub_result = None
         if subcmd:
-            subcmd.start(args)
+            subcmd._prepare()
+            sub_result = subcmd._parse(args)
+
+        return _ParseResult(context, actions_todo, subcmd, sub_result,
+                            warnings)
 
     def _display_usage(self, exit=True):
         ''' Displays usage of app based of flags and options
@@ -232,7 +789,7 @@ class App(object):
         if self._usage:
             print(self._usage)
             if exit:
-                sys.exit(0)
+                raise _ArgumentError(0)
 
         usage_str = ''
         if self._flags:
@@ -248,10 +805,10 @@ class App(object):
                                                  for arg in self._req_opts]))
         if self._req_pos_args:
             usage_str += ' <{}>'.format(' '
-                                        .join([arg.name
+                                        .join([arg.usage_name
                                                for arg in self._req_pos_args]))
         if self._pos_args:
-            usage_str += ' [{}]'.format(' '.join([arg.name
+            usage_str += ' [{}]'.format(' '.join([arg.usage_name
                                                  for arg in self._pos_args]))
         if self._subcmds:
             usage_str += ' [SUBCOMMANDS]'
@@ -259,7 +816,7 @@ class App(object):
                                        usage_str))
         if exit:
             print('\nFor more information try --help')
-            sys.exit(0)
+            raise _ArgumentError(0)
 
     def _display_help(self):
         """Displays the possible command line arguemnts to the user and
@@ -319,6 +876,7 @@ class App(object):
         """Builds a dict() of valid command line arguments based on
         Arg()s passed by the user.
         """
+        self._invalidate()
         self._args_map[arg.name] = arg
         if arg.short:
             self._args_map[arg.short] = arg
@@ -341,8 +899,52 @@ class App(object):
     def _add_subcmd_to_map(self, subcmd):
         """Builds a dict() of valid command line arguments based on Arg()s
         passed by the user."""
+        self._invalidate()
         self._subcmds_map[subcmd.name] = subcmd
         self._subcmds.append(subcmd)
+        if isinstance(subcmd, App):
+            subcmd._parents.append(self)
+
+    def _invalidate(self):
+        """Drops anything derived from the argument definitions (i.e. cached
+        parse results) because those definitions have changed"""
+        if self._cache is not None:
+            self._cache.clear()
+        self._suggestions = None
+        self._prepared = False
+        # Cached results of the apps this is a sub-command of include its
+        # results too
+        for parent in self._parents:
+            parent._invalidate()
+
+    def suggest(self, name, limit=3):
+        """Finds the long switches (for names starting with -) or sub-command
+        names closest to a mistyped one
+        PARAMS:
+            name: The mistyped switch or sub-command name as a string
+            limit: The maximum number of suggestions
+        RETURN: A list of the closest names, closest first
+        """
+        if self._suggestions is None:
+            self._suggestions = (
+                _BKTree(key for key in self._args_map
+                        if key.startswith('--')),
+                _BKTree(self._subcmds_map))
+        if name.startswith('-'):
+            tree = self._suggestions[0]
+        else:
+            tree = self._suggestions[1]
+        max_distance = 1
+        if len(name) > 3:
+            max_distance = 2
+        return [word for _, word in tree.search(name, max_distance)[:limit]]
+
+    def _did_you_mean(self, name):
+        """Returns a line suggesting replacements for name (or '')"""
+        suggestions = self.suggest(name)
+        if not suggestions:
+            return ''
+        return '\nDid you mean {}?'.format(' or '.join(suggestions))
 
     def _debug(self):
         """Displays debugging info"""
@@ -378,7 +980,10 @@ class App(object):
                 action=_null_func,
                 index=0,
                 args_taken=0,
-                required=False):
+                required=False,
+                multiple=False,
+                count=False,
+                rest=False):
         """Create and add a clapp.Arg() to the application on the fly
         PARAMS:
             name: The unique name of the argument as a string
@@ -395,7 +1000,13 @@ class App(object):
             args_taken: Int representing how many expected additional
                         arguments i.e. -o <file>
             required: Is this argument mandatory for proper script
-                      functionality?"""
+                      functionality?
+            multiple: May the argument be given more than once, collecting
+                      the additional arguments of every use into one list?
+            count: Should a flag count how many times it was given instead
+                   of being True or False?
+            rest: Should a positional argument take every remaining
+                  argument? main(context) receives an iterator over them"""
         arg = Arg(name,
                   long=long,
                   short=short,
@@ -404,7 +1015,10 @@ class App(object):
                   action=action,
                   index=index,
                   args_taken=args_taken,
-                  required=required)
+                  required=required,
+                  multiple=multiple,
+                  count=count,
+                  rest=rest)
 
         self._add_arg_to_map(arg)
 
@@ -471,6 +1085,59 @@ class App(object):
         for sc in subcmds:
             self.add_subcommand(sc)
 
+    def add_subcommand_plugins(self, group, cache_dir=''):
+        """Add the sub-commands other installed packages provide through an
+        entry point group. Each entry point's name is the sub-command name
+        and it must point to a clapp.SubCommand() (or a function returning
+        one) i.e. in the plugin's setup.py
+            entry_points={'myapp.subcommands': ['fake = myplugin:fake_cmd']}
+        A plugin is only imported when its sub-command is used, so until then
+        its about string is the Summary of the package providing it. The
+        names, about strings and targets are cached on disk (per Python
+        interpreter) until the set of installed packages changes.
+        PARAMS:
+            group: The entry point group name as a string
+            cache_dir: (optional) Where to keep the cache (defaults to
+                       $XDG_CACHE_HOME/clapp or ~/.cache/clapp)
+        """
+        for plugin in _discover_plugins(group, cache_dir):
+            self.add_subcommand(_PluginSubCommand(*plugin))
+
+    def _get_subcmd(self, name):
+        """Returns the sub-command named name, importing it first if it was
+        provided by a plugin"""
+        subcmd = self._subcmds_map[name]
+        if isinstance(subcmd, _PluginSubCommand):
+            plugin = subcmd
+            subcmd = plugin.load()
+            self._subcmds_map[name] = subcmd
+            self._subcmds[self._subcmds.index(plugin)] = subcmd
+            subcmd._parents.append(self)
+        return subcmd
+
+    def extract_columns(self, lines):
+        """Parses many command lines (i.e. from shell history or audit logs)
+        without performing any actions or calling main(). Instead of a
+        context dict() per command line, the values are stored per argument
+        for only the command lines which use it. Tokens are split and checked
+        like start() does: lines start() would reject get an error, lines
+        only missing required options get a warning.
+        PARAMS:
+            lines: An iterable of command lines including the script name,
+                   each either a list of arguments or a string which is split
+                   like a shell would
+        RETURN: A clapp.Columns()
+        """
+        columns = Columns()
+        columns._extract(self, lines)
+        return columns
+
+    def new_parse_state(self):
+        """Create a clapp.ParseState() for validating a command line of this
+        application one token at a time (i.e. from an interactive shell)
+        """
+        return ParseState(self)
+
     def _add_help(self):
         """Determines if the user provided his own --help or -h arguments
         and adds a default implementation if it doesn't find any
@@ -565,6 +1232,39 @@ class App(object):
     def usage(self, value):
         self._usage = value
 
+    @property
+    def batch_results(self):
+        """A list of (exit status, selected main(context) return value)
+        tuples, one per command line of the last start_many() in command line
+        order"""
+        return self._batch_results
+
+    @property
+    def cache_size(self):
+        if self._cache is None:
+            return 0
+        return self._cache.info()['max_size']
+
+    @cache_size.setter
+    def cache_size(self, value):
+        self._cache = None
+        if value > 0:
+            self._cache = _LRUCache(value)
+
+    @property
+    def cache_info(self):
+        """A dict() of the parse cache's 'hits', 'misses', 'evictions',
+        'size' and 'max_size' counters"""
+        if self._cache is None:
+            return {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0,
+                    'max_size': 0}
+        return self._cache.info()
+
+    def clear_cache(self):
+        """Forgets all cached parse results"""
+        if self._cache is not None:
+            self._cache.clear()
+
 
 class SubCommand(App):
     def __init__(self,
@@ -590,18 +1290,686 @@ class SubCommand(App):
         RETURN: Returns whatever your main(context) returns in order to allow
                 sys.exit(app.start())
         """
-        # Add a help command line argument if needed (i.e. -h and --help)
-        self._add_help()
-        # Add a version command line argument if needed (i.e. -v and --version)
-        self._add_version()
+        self._prepare()
+        return self._dispatch(self._parse(args))
 
-        self._raw_args = args
-        self._context['raw_args'] = args
-        self._do_args(args[1:])
 
-        if self._has_main:
-            return self._main(self._context)
-        return self._context
+class _PluginSubCommand(object):
+    """Stands in for a sub-command provided by a plugin until it is used"""
+    def __init__(self, name, about, target):
+        self.name = name
+        self.about = about
+        self.target = target
+
+    def load(self):
+        """Imports the plugin
+        RETURN: The clapp.SubCommand() the entry point refers to
+        """
+        return _load_plugin(self.name, self.target)
+
+
+def _load_plugin(name, target):
+    """Imports a 'module:attr' entry point target which names a SubCommand()
+    or a function returning one"""
+    module_name, _, attrs = target.split('[')[0].strip().partition(':')
+    obj = __import__(module_name, fromlist=['__name__'])
+    for attr in attrs.split('.'):
+        if attr:
+            obj = getattr(obj, attr)
+    if not isinstance(obj, SubCommand):
+        obj = obj()
+    if not isinstance(obj, SubCommand) or obj.name != name:
+        raise RuntimeError('Plugin {} must provide a SubCommand named '
+                           '{}.'.format(target, name))
+    return obj
+
+
+def _iter_entry_points(group):
+    """Yields the (name, about, target) of every entry point in group without
+    importing anything. The about string is the Summary of the distribution
+    providing the entry point, when it can be found
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
+        import pkg_resources
+        for ep in pkg_resources.iter_entry_points(group):
+            yield (ep.name, '',
+                   '{}:{}'.format(ep.module_name, '.'.join(ep.attrs)))
+        return
+    eps = metadata.entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=group)
+    else:
+        eps = eps.get(group, [])
+    for ep in eps:
+        about = ''
+        dist = getattr(ep, 'dist', None)
+        if dist is not None:
+            about = dist.metadata.get('Summary') or ''
+        yield ep.name, about, ep.value
+
+
+def _installed_fingerprint():
+    """Returns a string which changes whenever a package is installed or
+    removed. Doing so adds, removes or renames its metadata directory which
+    changes the modification time of the sys.path entry containing it. Only
+    the entries holding package metadata count, and never the script's or
+    current directory, so unrelated files coming and going don't matter.
+    """
+    skip = set([path.abspath(os.getcwd())])
+    if sys.argv and sys.argv[0]:
+        skip.add(path.abspath(path.dirname(sys.argv[0])))
+    parts = []
+    for entry in sys.path:
+        entry = path.abspath(entry or '.')
+        if entry in skip or not path.isdir(entry):
+            continue
+        try:
+            names = os.listdir(entry)
+            mtime = os.stat(entry).st_mtime
+        except OSError:
+            continue
+        if any(name.endswith(('.dist-info', '.egg-info')) for name in names):
+            parts.append('{}={}'.format(entry, mtime))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _discover_plugins(group, cache_dir=''):
+    """Finds the sub-command plugins of an entry point group
+    RETURN: A list of [name, about, target] lists
+    """
+    if not cache_dir:
+        cache_dir = os.environ.get('XDG_CACHE_HOME',
+                                   path.join(path.expanduser('~'), '.cache'))
+        cache_dir = path.join(cache_dir, 'clapp')
+    # Each interpreter (i.e. virtualenv) has its own set of packages
+    interpreter = hashlib.sha1('{}\n{}'.format(sys.prefix, sys.executable)
+                               .encode('utf-8')).hexdigest()[:12]
+    cache_file = path.join(cache_dir, '{}-{}.json'.format(group, interpreter))
+    fingerprint = _installed_fingerprint()
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+        if cached['fingerprint'] == fingerprint:
+            return cached['plugins']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    plugins = [list(plugin) for plugin in _iter_entry_points(group)]
+
+    try:
+        if not path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_file = '{}.{}'.format(cache_file, os.getpid())
+        with open(tmp_file, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'plugins': plugins}, f)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError):
+        pass
+    return plugins
+
+
+class ParseState(object):
+    """Validates a command line one token at a time without printing or
+    exiting. Every token fed records how to undo itself, so rolling back to an
+    earlier position only costs as much as the tokens being removed.
+    """
+    def __init__(self, app):
+        """Initializes an empty command line for app
+        PARAMS:
+            app: The clapp.App() or clapp.SubCommand() to validate against
+        """
+        app._prepare()
+        self._app = app
+        # One undo record per token fed, or None if the token was handed to
+        # the sub-command's state
+        self._log = []
+        self._pending = None
+        self._pos_args = 0
+        self._values = dict()
+        self._errors = []
+        self._subcmd = None
+        self._sub = None
+        # The rest=True positional argument taking every remaining token
+        self._rest = None
+
+    def feed(self, token):
+        """Validates the next token of the command line
+        PARAMS:
+            token: A single command line argument as a string
+        """
+        if self._sub is not None:
+            self._log.append(None)
+            self._sub.feed(token)
+            return
+        changes = []
+        self._log.append((self._pending, self._pos_args, len(self._errors),
+                          self._rest, changes))
+        if self._rest is not None:
+            values = self._values[self._rest.name]
+            changes.append((self._rest.name, _Truncate(len(values))))
+            values.append(token)
+        else:
+            self._feed_token(token, changes)
+
+    def _feed_token(self, token, changes):
+        """Splits token the same way App._do_args() does: additional
+        arguments are taken whole, otherwise a token is split at its first
+        '=' and -abc style flags are split into -a -b -c
+        """
+        if self._sub is not None:
+            # The rest of a token which selected a sub-command
+            self._sub.feed(token)
+            return
+        if self._pending is None and not self._starts_rest(token):
+            if token.find('=') != -1:
+                token, value = token.split('=', 1)
+                self._feed_token(token, changes)
+                self._feed_token(value, changes)
+                return
+            if (not token.startswith('--') and token.startswith('-') and
+                    len(token) > 2):
+                for char in token:
+                    if char != '-':
+                        self._feed_token('-{}'.format(char), changes)
+                return
+        self._feed_one(token, changes)
+
+    def _starts_rest(self, token):
+        """Would token be the first one for a rest=True positional
+        argument?"""
+        app = self._app
+        rest = app._args_map.get('index{}'.format(self._pos_args + 1))
+        return bool(rest and rest.rest and token not in app._args_map and
+                    token not in app._subcmds_map and
+                    (token == '-' or not token.startswith('-')))
+
+    def feed_all(self, tokens):
+        """Validates several tokens in order"""
+        for token in tokens:
+            self.feed(token)
+
+    def rollback(self, position):
+        """Forgets every token after position
+        PARAMS:
+            position: The number of tokens to keep (see ParseState.position)
+        """
+        while len(self._log) > position:
+            record = self._log.pop()
+            if record is None:
+                self._sub.rollback(self._sub.position - 1)
+                continue
+            pending, pos_args, num_errors, rest, changes = record
+            for name, old in reversed(changes):
+                if old is _MISSING:
+                    del self._values[name]
+                elif isinstance(old, _Truncate):
+                    del self._values[name][old.length:]
+                else:
+                    self._values[name] = old
+            del self._errors[num_errors:]
+            self._pending = pending
+            self._pos_args = pos_args
+            self._rest = rest
+            self._subcmd = None
+            self._sub = None
+
+    def _feed_one(self, token, changes):
+        app = self._app
+        if self._pending is not None:
+            argo, taken = self._pending
+            if not token.startswith('-'):
+                taken = taken + (token,)
+                if len(taken) == argo.args_taken:
+                    self._pending = None
+                    values = self._values.get(argo.name)
+                    if argo.multiple and values is not None:
+                        # Appended in place, rollback truncates it again
+                        changes.append((argo.name, _Truncate(len(values))))
+                        values.extend(taken)
+                    else:
+                        self._set(argo, list(taken), changes)
+                else:
+                    self._pending = (argo, taken)
+                return
+            self._errors.append('{} expected {} arguments but received '
+                                '{}.'.format(argo.name, argo.args_taken,
+                                             len(taken)))
+            self._pending = None
+
+        if self._starts_rest(token):
+            self._pos_args += 1
+            self._rest = app._args_map['index{}'.format(self._pos_args)]
+            self._set(self._rest, [token], changes)
+            return
+
+        if token in app._args_map:
+            argo = app._args_map[token]
+        elif token in app._subcmds_map:
+            self._subcmd = app._get_subcmd(token)
+            self._sub = ParseState(self._subcmd)
+            return
+        elif (not token.startswith('-') and
+              'index{}'.format(self._pos_args + 1) in app._args_map):
+            self._pos_args += 1
+            argo = app._args_map['index{}'.format(self._pos_args)]
+            self._set(argo, token, changes)
+            return
+        else:
+            self._errors.append('{} doesn\'t accept any arguments like '
+                                '{}.{}'.format(app.name, token,
+                                               app._did_you_mean(token)))
+            return
+
+        if argo.args_taken:
+            self._pending = (argo, ())
+        elif argo.count:
+            self._set(argo, self._values.get(argo.name, 0) + 1, changes)
+        else:
+            self._set(argo, True, changes)
+
+    def _set(self, argo, value, changes):
+        changes.append((argo.name, self._values.get(argo.name, _MISSING)))
+        self._values[argo.name] = value
+
+    def validate(self):
+        """Returns a list of error messages for the command line as a whole,
+        i.e. the problems which would stop App.start(): ParseState.errors
+        plus a switch still waiting on additional arguments and too few
+        required positional arguments"""
+        errors = self.errors
+        state = self
+        while state is not None:
+            if state._pos_args < len(state._app._req_pos_args):
+                errors.append('Required number of positional arguments not '
+                              'found.')
+            if state._sub is None and state._pending is not None:
+                argo, taken = state._pending
+                errors.append('{} expected {} arguments but received '
+                              '{}.'.format(argo.name, argo.args_taken,
+                                           len(taken)))
+            state = state._sub
+        return errors
+
+    def warnings(self):
+        """Returns a list of the messages App.start() would only print while
+        carrying on anyway, i.e. for missing required options"""
+        warnings = []
+        state = self
+        while state is not None:
+            for arg in state._app._req_opts:
+                if arg.name not in state._values:
+                    warnings.append('Required option {} not found.'.format(
+                        arg.long or arg.short))
+            state = state._sub
+        return warnings
+
+    def missing(self):
+        """Returns a list of the required clapp.Arg()s not yet supplied,
+        including those of the selected sub-command"""
+        app = self._app
+        missing = [arg for arg in app._req_pos_args
+                   if arg.name not in self._values]
+        missing.extend(arg for arg in app._req_opts
+                       if arg.name not in self._values)
+        if self._sub is not None:
+            missing.extend(self._sub.missing())
+        return missing
+
+    def valid_next(self, prefix=''):
+        """Describes what may be typed next
+        PARAMS:
+            prefix: Only suggest options and sub-commands starting with this
+        RETURN: A dict() with the keys
+            'value_for': The clapp.Arg() waiting on additional arguments (or
+                         None)
+            'values_left': How many more arguments 'value_for' expects
+            'positional': The clapp.Arg() the next positional argument fills
+                          (or None)
+            'options': A sorted list of valid short and long switches
+            'subcommands': A sorted list of valid sub-command names
+            'missing': The required clapp.Arg()s not yet supplied
+        """
+        if self._sub is not None:
+            valid = self._sub.valid_next(prefix)
+            valid['missing'] = self.missing()
+            return valid
+        app = self._app
+        valid = {'value_for': None,
+                 'values_left': 0,
+                 'positional': None,
+                 'options': [],
+                 'subcommands': [],
+                 'missing': self.missing()}
+        if self._pending is not None:
+            argo, taken = self._pending
+            valid['value_for'] = argo
+            valid['values_left'] = argo.args_taken - len(taken)
+            return valid
+        if self._rest is not None:
+            valid['positional'] = self._rest
+            return valid
+        valid['positional'] = app._args_map.get(
+            'index{}'.format(self._pos_args + 1))
+        valid['options'] = sorted(key for key in app._args_map
+                                  if key.startswith('-') and
+                                  key.startswith(prefix))
+        valid['subcommands'] = sorted(name for name in app._subcmds_map
+                                      if name.startswith(prefix))
+        return valid
+
+    @property
+    def position(self):
+        """The number of tokens fed so far"""
+        return len(self._log)
+
+    @property
+    def errors(self):
+        """A list of error messages for the tokens fed so far"""
+        if self._sub is not None:
+            return self._errors + self._sub.errors
+        return list(self._errors)
+
+    @property
+    def values(self):
+        """A dict() of argument names to the values supplied so far"""
+        return dict(self._values)
+
+    @property
+    def subcommand(self):
+        """The selected clapp.SubCommand() (or None)"""
+        return self._subcmd
+
+    @property
+    def sub_state(self):
+        """The ParseState of the selected sub-command (or None)"""
+        return self._sub
+
+
+class Column(object):
+    """The values of one argument across many command lines. Only the rows
+    (command line numbers) which set the argument are stored, along with
+    their values.
+    """
+    # A switch which takes no additional arguments, always True when set
+    FLAG = 'flag'
+    # A count=True flag, values are kept in an array of ints
+    COUNT = 'count'
+    # A positional argument, values are (interned) strings
+    VALUE = 'value'
+    # A switch taking additional arguments (or a rest=True positional
+    # argument), values are tuples of (interned) strings
+    VALUES = 'values'
+
+    def __init__(self, name, kind):
+        self._name = name
+        self._kind = kind
+        self._rows = array('i')
+        self._values = None
+        if kind == Column.COUNT:
+            self._values = array('i')
+        elif kind != Column.FLAG:
+            self._values = []
+
+    def append(self, row, value):
+        """Records the value of a row, rows must be appended in order"""
+        self._rows.append(row)
+        if self._kind == Column.VALUE:
+            self._values.append(_intern(value))
+        elif self._kind == Column.VALUES:
+            self._values.append(tuple(_intern(v) for v in value))
+        elif self._kind == Column.COUNT:
+            self._values.append(value)
+
+    def dense(self, num_rows, missing=None):
+        """Returns a list with a value for every row, using missing for the
+        rows which don't set the argument"""
+        values = [missing] * num_rows
+        if self._values is None:
+            for row in self._rows:
+                values[row] = True
+        else:
+            for row, value in zip(self._rows, self._values):
+                values[row] = value
+        return values
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def kind(self):
+        return self._kind
+
+    @property
+    def rows(self):
+        """An array of the row numbers which set the argument"""
+        return self._rows
+
+    @property
+    def values(self):
+        """The values of each of Column.rows (None for Column.FLAG)"""
+        return self._values
+
+
+class Columns(object):
+    """Command lines parsed by App.extract_columns(), stored as one
+    clapp.Column() per argument used. Arguments of sub-commands are named
+    '<sub-command> <argument>'.
+    """
+    _MAGIC = b'CLAPPCOLS 1\n'
+
+    def __init__(self):
+        self._num_rows = 0
+        self._columns = OrderedDict()
+        self._subcommand = Column('subcommand', Column.VALUE)
+        self._error = Column('error', Column.VALUE)
+        self._warning = Column('warning', Column.VALUE)
+
+    def _extract(self, app, lines):
+        state = ParseState(app)
+        for line in lines:
+            row = self._num_rows
+            self._num_rows += 1
+            if not isinstance(line, (list, tuple)):
+                if sys.version_info[0] == 2 and isinstance(line, unicode):
+                    # Python 2.x's shlex only handles byte strings
+                    line = line.encode('utf-8')
+                try:
+                    line = shlex.split(line)
+                except ValueError as e:
+                    # i.e. unbalanced quotes
+                    self._error.append(row, str(e))
+                    continue
+            # Rolling back only costs as much as the previous line
+            state.rollback(0)
+            state.feed_all(line[1:])
+
+            errors = state.validate()
+            if errors:
+                self._error.append(row, '\n'.join(errors))
+            warnings = state.warnings()
+            if warnings:
+                self._warning.append(row, '\n'.join(warnings))
+            self._add_values(row, '', state)
+            sub_names = []
+            sub = state
+            while sub.sub_state is not None:
+                sub_names.append(sub.subcommand.name)
+                sub = sub.sub_state
+                self._add_values(row, '{} '.format(' '.join(sub_names)), sub)
+            if sub_names:
+                self._subcommand.append(row, ' '.join(sub_names))
+
+    def _add_values(self, row, prefix, state):
+        args_map = state._app._args_map
+        for name, value in state._values.items():
+            key = prefix + name
+            column = self._columns.get(key)
+            if column is None:
+                argo = args_map[name]
+                if argo.count:
+                    kind = Column.COUNT
+                elif argo.args_taken or argo.rest:
+                    kind = Column.VALUES
+                elif argo.index:
+                    kind = Column.VALUE
+                else:
+                    kind = Column.FLAG
+                column = Column(key, kind)
+                self._columns[key] = column
+            column.append(row, value)
+
+    def column(self, name):
+        """Returns the clapp.Column() of an argument (or None if no command
+        line used it)"""
+        return self._columns.get(name)
+
+    def to_csv(self, f):
+        """Writes one row per command line with a 'subcommand', 'error' and
+        'warning' column followed by one column per argument. Multiple values are
+        separated by spaces.
+        PARAMS:
+            f: A file opened for writing text
+        """
+        columns = ([self._subcommand, self._error, self._warning] +
+                   list(self.columns))
+        writer = csv.writer(f)
+        writer.writerow([c.name for c in columns])
+        cells = []
+        for c in columns:
+            if c.kind == Column.VALUES:
+                cells.append([' '.join(v) if v is not None else ''
+                              for v in c.dense(self._num_rows)])
+            else:
+                cells.append(c.dense(self._num_rows, ''))
+        for row in zip(*cells):
+            writer.writerow(row)
+
+    def to_binary(self, f):
+        """Writes the columns in a compact binary format: a magic line, a
+        JSON header line describing each column (including its table of
+        distinct strings), then for each column in header order its array of
+        rows followed by an array of values (counts), an array of indices
+        into the string table (values), or an array of value lengths and an
+        array of indices (multiple values)
+        PARAMS:
+            f: A file opened for writing bytes
+        """
+        header = {'num_rows': self._num_rows,
+                  'byteorder': sys.byteorder,
+                  'itemsize': array('i').itemsize,
+                  'columns': []}
+        blocks = []
+        for c in ([self._subcommand, self._error, self._warning] +
+                  list(self.columns)):
+            meta = {'name': c.name, 'kind': c.kind, 'length': len(c)}
+            blocks.append(c.rows)
+            if c.kind == Column.COUNT:
+                blocks.append(c.values)
+            elif c.kind != Column.FLAG:
+                table = OrderedDict()
+                lengths = array('i')
+                indices = array('i')
+                for value in c.values:
+                    if c.kind == Column.VALUE:
+                        value = (value,)
+                    else:
+                        lengths.append(len(value))
+                    for v in value:
+                        indices.append(table.setdefault(v, len(table)))
+                meta['strings'] = list(table)
+                if c.kind == Column.VALUES:
+                    blocks.append(lengths)
+                    meta['num_indices'] = len(indices)
+                blocks.append(indices)
+            header['columns'].append(meta)
+        f.write(self._MAGIC)
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        for block in blocks:
+            block.tofile(f)
+
+    @staticmethod
+    def from_binary(f):
+        """Reads columns written by Columns.to_binary()
+        PARAMS:
+            f: A file opened for reading bytes
+        RETURN: A clapp.Columns()
+        """
+        if f.readline() != Columns._MAGIC:
+            raise RuntimeError('Not a clapp columns file.')
+        header = json.loads(f.readline().decode('utf-8'))
+        if header['itemsize'] != array('i').itemsize:
+            raise RuntimeError('Columns file has an incompatible item size.')
+        swap = header['byteorder'] != sys.byteorder
+
+        def read(length):
+            block = array('i')
+            block.fromfile(f, length)
+            if swap:
+                block.byteswap()
+            return block
+
+        columns = Columns()
+        columns._num_rows = header['num_rows']
+        for i, meta in enumerate(header['columns']):
+            c = Column(meta['name'], meta['kind'])
+            c._rows = read(meta['length'])
+            if c.kind == Column.COUNT:
+                c._values = read(meta['length'])
+            elif c.kind == Column.VALUE:
+                strings = [_intern(v) for v in meta['strings']]
+                c._values = [strings[index]
+                             for index in read(meta['length'])]
+            elif c.kind == Column.VALUES:
+                strings = [_intern(v) for v in meta['strings']]
+                lengths = read(meta['length'])
+                indices = iter(read(meta['num_indices']))
+                c._values = [tuple(strings[next(indices)]
+                                   for _ in range(length))
+                             for length in lengths]
+            # The sub-command, error and warning columns are always written first
+            if i == 0:
+                columns._subcommand = c
+            elif i == 1:
+                columns._error = c
+            elif i == 2:
+                columns._warning = c
+            else:
+                columns._columns[c.name] = c
+        return columns
+
+    @property
+    def num_rows(self):
+        """The number of command lines"""
+        return self._num_rows
+
+    @property
+    def columns(self):
+        """The clapp.Column()s of the arguments used, in order of first
+        use"""
+        return self._columns.values()
+
+    @property
+    def subcommand(self):
+        """A clapp.Column() of the selected sub-command names (nested
+        sub-commands are separated by spaces)"""
+        return self._subcommand
+
+    @property
+    def error(self):
+        """A clapp.Column() of the error messages of invalid command lines"""
+        return self._error
+
+    @property
+    def warning(self):
+        """A clapp.Column() of the warnings for command lines missing
+        required options"""
+        return self._warning
 
 
 class Arg(object):
@@ -614,7 +1982,10 @@ class Arg(object):
                  args_taken=0,
                  action=_null_func,
                  index=0,
-                 required=False):
+                 required=False,
+                 multiple=False,
+                 count=False,
+                 rest=False):
         if not name:
             raise RuntimeError('Arg(name) must have a unique name string.')
         self._short = short
@@ -631,6 +2002,9 @@ class Arg(object):
         self._index = index
         self._name = name
         self._args_taken = args_taken
+        self._multiple = multiple
+        self._count = count
+        self._rest = rest
 
     @property
     def name(self):
@@ -710,3 +2084,34 @@ class Arg(object):
     @args_taken.setter
     def args_taken(self, value):
         self._args_taken = value
+
+    @property
+    def multiple(self):
+        return self._multiple
+
+    @multiple.setter
+    def multiple(self, value):
+        self._multiple = value
+
+    @property
+    def count(self):
+        return self._count
+
+    @count.setter
+    def count(self, value):
+        self._count = value
+
+    @property
+    def rest(self):
+        return self._rest
+
+    @rest.setter
+    def rest(self, value):
+        self._rest = value
+
+    @property
+    def usage_name(self):
+        """The name shown for a positional argument in usage strings"""
+        if self._rest:
+            return '{}...'.format(self._name)
+        return self._name